@@ -3,9 +3,9 @@ from bot.bot import Bot
 from ._redis_cache import DocRedisCache
 
 MAX_SIGNATURE_AMOUNT = 3
-PRIORITY_PACKAGES = (
+PRIORITY_PACKAGES = frozenset({
     "python",
-)
+})
 NAMESPACE = "doc"
 
 doc_cache = DocRedisCache(namespace=NAMESPACE)
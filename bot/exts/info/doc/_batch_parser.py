@@ -1,14 +1,12 @@
 from __future__ import annotations
 
 import asyncio
-import collections
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict
 from contextlib import suppress
-from operator import attrgetter
-from typing import NamedTuple
 
+import aiohttp
 import discord
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from pydis_core.utils import scheduling
 
 import bot
@@ -16,11 +14,52 @@ from bot.constants import Channels
 from bot.log import get_logger
 
 from . import _cog, doc_cache
-from ._parsing import get_symbol_markdown
+from ._parsing import get_symbol_headings, get_symbol_markdown
 from ._redis_cache import StaleItemCounter
 
 log = get_logger(__name__)
 
+PAGE_FETCH_TIMEOUT = aiohttp.ClientTimeout(total=30, sock_connect=5, sock_read=10)
+# Maximum amount of seconds `BatchParser.clear` waits for requested symbols
+CLEAR_TIMEOUT = 30
+# Maximum amount of items from a single page parsed in one worker thread call
+PARSE_BATCH_SIZE = 20
+
+# Sphinx themes mark the element holding the page's documentation with `role="main"`,
+# everything outside of it (head, navigation, sidebars) can be skipped when building the tree.
+_MAIN_CONTENT_STRAINER = SoupStrainer(role="main")
+
+
+def _parse_page(html: bytes, encoding: str | None) -> BeautifulSoup:
+    """
+    Parse the documentation content of the page `html` into a `BeautifulSoup` tree.
+
+    The raw bytes are decoded with `encoding` if it's passed, otherwise the encoding is detected from the document.
+    Only the main content element is parsed; the whole page is used if it doesn't have one.
+    """
+    soup = BeautifulSoup(html, "lxml", parse_only=_MAIN_CONTENT_STRAINER, from_encoding=encoding)
+    # The doctype is kept even when nothing matched the strainer, check for an actual element.
+    if soup.find(True) is None:
+        soup = BeautifulSoup(html, "lxml", from_encoding=encoding)
+    return soup
+
+
+def _get_batch_markdown(soup: BeautifulSoup, doc_items: list[_cog.DocItem]) -> dict[_cog.DocItem, str | None]:
+    """
+    Get the Markdown of all `doc_items` from `soup`.
+
+    Items which raised an unexpected error while parsing are logged and left out of the result.
+    """
+    # Indexing the page once is cheaper than searching the whole tree for every item.
+    symbol_headings = get_symbol_headings(soup) if len(doc_items) > 1 else None
+    results = {}
+    for item in doc_items:
+        try:
+            results[item] = get_symbol_markdown(soup, item, symbol_headings)
+        except Exception:
+            log.exception(f"Unexpected error when handling {item}")
+    return results
+
 
 class StaleInventoryNotifier:
     """Handle sending notifications about stale inventories through `DocItem`s to dev log."""
@@ -54,31 +93,6 @@ class StaleInventoryNotifier:
                 await self._dev_log.send(embed=embed)
 
 
-class QueueItem(NamedTuple):
-    """Contains a `DocItem` and the `BeautifulSoup` object needed to parse it."""
-
-    doc_item: _cog.DocItem
-    soup: BeautifulSoup
-
-    def __eq__(self, other: QueueItem | _cog.DocItem):
-        if isinstance(other, _cog.DocItem):
-            return self.doc_item == other
-        return NamedTuple.__eq__(self, other)
-
-
-class ParseResultFuture(asyncio.Future):
-    """
-    Future with metadata for the parser class.
-
-    `user_requested` is set by the parser when a Future is requested by an user and moved to the front,
-    allowing the futures to only be waited for when clearing if they were user requested.
-    """
-
-    def __init__(self):
-        super().__init__()
-        self.user_requested = False
-
-
 class BatchParser:
     """
     Get the Markdown of all symbols on a page and send them to redis when a symbol is requested.
@@ -89,9 +103,13 @@ class BatchParser:
     """
 
     def __init__(self):
-        self._queue: deque[QueueItem] = collections.deque()
+        # Maps queued items to the soup of their page, the last item is at the front of the queue.
+        self._queue: OrderedDict[_cog.DocItem, BeautifulSoup] = OrderedDict()
         self._page_doc_items: dict[str, list[_cog.DocItem]] = defaultdict(list)
-        self._item_futures: dict[_cog.DocItem, ParseResultFuture] = defaultdict(ParseResultFuture)
+        # Futures are only created for items requested through `get_markdown`.
+        self._item_futures: dict[_cog.DocItem, asyncio.Future] = {}
+        # Items popped from the queue whose results weren't set yet.
+        self._parsing_items: set[_cog.DocItem] = set()
         self._parse_task = None
 
         self.stale_inventory_notifier = StaleInventoryNotifier()
@@ -101,32 +119,56 @@ class BatchParser:
         Get the result Markdown of `doc_item`.
 
         If no symbols were fetched from `doc_item`s page before,
-        the HTML has to be fetched and then all items from the page are put into the parse queue.
+        the HTML has to be fetched and then all items from the page are put into the parse queue,
+        except for the ones that already have their Markdown stored in redis.
 
         Not safe to run while `self.clear` is running.
         """
-        if doc_item not in self._item_futures and doc_item not in self._queue:
-            self._item_futures[doc_item].user_requested = True
-
-            async with bot.instance.http_session.get(doc_item.url, raise_for_status=True) as response:
-                soup = await bot.instance.loop.run_in_executor(
-                    None,
-                    BeautifulSoup,
-                    await response.text(encoding="utf8"),
-                    "lxml",
-                )
+        if (future := self._item_futures.get(doc_item)) is None:
+            future = self._item_futures[doc_item] = asyncio.get_running_loop().create_future()
 
-            self._queue.extendleft(QueueItem(item, soup) for item in self._page_doc_items[doc_item.url])
-            log.debug(f"Added items from {doc_item.url} to the parse queue.")
-
-            if self._parse_task is None:
-                self._parse_task = scheduling.create_task(self._parse_queue(), name="Queue parse")
-        else:
-            self._item_futures[doc_item].user_requested = True
-        with suppress(ValueError):
+            if doc_item not in self._queue and doc_item not in self._parsing_items:
+                try:
+                    async with bot.instance.http_session.get(
+                        doc_item.url, timeout=PAGE_FETCH_TIMEOUT, raise_for_status=True
+                    ) as response:
+                        soup = await asyncio.to_thread(_parse_page, await response.read(), response.charset)
+                    cached_symbol_ids = await doc_cache.get_page_symbol_ids(doc_item)
+                except asyncio.CancelledError:
+                    # Cancelling the future would also cancel the other requests waiting on it,
+                    # fail them with an ordinary error instead and let the next request try again.
+                    self._item_futures.pop(doc_item, None)
+                    if not future.done():
+                        future.set_exception(RuntimeError(f"Fetching the page of {doc_item} was cancelled."))
+                        # Mark the exception as retrieved, there may be no other requests waiting on the future.
+                        future.exception()
+                    raise
+                except Exception as e:
+                    # Nothing will set the result of the future, pass the error on to everything waiting on it
+                    # and let the next request try again. `clear` may have already resolved the future.
+                    self._item_futures.pop(doc_item, None)
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    for item in self._page_doc_items[doc_item.url]:
+                        if (
+                            item != doc_item
+                            and item.package == doc_item.package
+                            and item.symbol_id in cached_symbol_ids
+                        ):
+                            continue
+                        self._queue[item] = soup
+                        self._queue.move_to_end(item, last=False)
+                    # The page's items may have changed while it was fetched, make sure the requested item is parsed.
+                    self._queue[doc_item] = soup
+                    log.debug(f"Added items from {doc_item.url} to the parse queue.")
+
+                    if self._parse_task is None:
+                        self._parse_task = scheduling.create_task(self._parse_queue(), name="Queue parse")
+        with suppress(KeyError):
             # If the item is not in the queue then the item is already parsed or is being parsed
             self._move_to_front(doc_item)
-        return await self._item_futures[doc_item]
+        return await future
 
     async def _parse_queue(self) -> None:
         """
@@ -137,57 +179,84 @@ class BatchParser:
         log.trace("Starting queue parsing.")
         try:
             while self._queue:
-                item, soup = self._queue.pop()
-                markdown = None
-
-                if (future := self._item_futures[item]).done():
-                    # Some items are present in the inventories multiple times under different symbol names,
-                    # if we already parsed an equal item, we can just skip it.
-                    continue
-
-                try:
-                    markdown = await bot.instance.loop.run_in_executor(None, get_symbol_markdown, soup, item)
-                    if markdown is not None:
-                        await doc_cache.set(item, markdown)
-                    else:
-                        # Don't wait for this coro as the parsing doesn't depend on anything it does.
-                        scheduling.create_task(
-                            self.stale_inventory_notifier.send_warning(item), name="Stale inventory warning"
-                        )
-                except Exception:
-                    log.exception(f"Unexpected error when handling {item}")
-                future.set_result(markdown)
-                del self._item_futures[item]
-                await asyncio.sleep(0.1)
+                soup, items = self._pop_batch()
+                self._parsing_items.update(items)
+                results = await asyncio.to_thread(_get_batch_markdown, soup, items)
+                for item in items:
+                    # Items missing from the results failed to parse; the error was logged by the worker thread.
+                    markdown = results.get(item)
+                    try:
+                        if markdown is not None:
+                            await doc_cache.set(item, markdown)
+                        elif item in results:
+                            # Don't wait for this coro as the parsing doesn't depend on anything it does.
+                            scheduling.create_task(
+                                self.stale_inventory_notifier.send_warning(item), name="Stale inventory warning"
+                            )
+                    except Exception:
+                        log.exception(f"Unexpected error when handling {item}")
+                    if (future := self._item_futures.pop(item, None)) is not None:
+                        future.set_result(markdown)
+                    self._parsing_items.discard(item)
+                # Let other tasks run between batches.
+                await asyncio.sleep(0)
         finally:
             self._parse_task = None
+            self._parsing_items.clear()
             log.trace("Finished parsing queue.")
 
-    def _move_to_front(self, item: QueueItem | _cog.DocItem) -> None:
-        """Move `item` to the front of the parse queue."""
-        # The parse queue stores soups along with the doc symbols in QueueItem objects,
-        # in case we're moving a DocItem we have to get the associated QueueItem first and then move it.
-        item_index = self._queue.index(item)
-        queue_item = self._queue[item_index]
-        del self._queue[item_index]
+    def _pop_batch(self) -> tuple[BeautifulSoup, list[_cog.DocItem]]:
+        """
+        Pop the item at the front of the queue along with the following items that share its page.
 
-        self._queue.append(queue_item)
+        User-requested items are returned on their own so they don't have to wait for the rest of the batch,
+        other items are batched up to `PARSE_BATCH_SIZE` items.
+        """
+        item, soup = self._queue.popitem()
+        batch = [item]
+        if item in self._item_futures:
+            return soup, batch
+
+        while self._queue and len(batch) < PARSE_BATCH_SIZE:
+            item = next(reversed(self._queue))
+            if self._queue[item] is not soup:
+                break
+            del self._queue[item]
+            batch.append(item)
+        return soup, batch
+
+    def _move_to_front(self, item: _cog.DocItem) -> None:
+        """Move `item` to the front of the parse queue."""
+        self._queue.move_to_end(item)
         log.trace(f"Moved {item} to the front of the queue.")
 
     def add_item(self, doc_item: _cog.DocItem) -> None:
         """Map a DocItem to its page so that the symbol will be parsed once the page is requested."""
         self._page_doc_items[doc_item.url].append(doc_item)
 
+    def remove_package(self, package_name: str) -> None:
+        """Remove the items of `package_name` from their pages; items that are already queued are still parsed."""
+        for url, doc_items in list(self._page_doc_items.items()):
+            doc_items[:] = [item for item in doc_items if item.package != package_name]
+            if not doc_items:
+                del self._page_doc_items[url]
+
     async def clear(self) -> None:
         """
         Clear all internal symbol data.
 
-        Wait for all user-requested symbols to be parsed before clearing the parser.
+        Wait up to `CLEAR_TIMEOUT` seconds for all requested symbols to be parsed before clearing the parser,
+        symbols that aren't parsed in time get a None result.
         """
-        for future in filter(attrgetter("user_requested"), self._item_futures.values()):
-            await future
+        if self._item_futures:
+            _, pending = await asyncio.wait(self._item_futures.values(), timeout=CLEAR_TIMEOUT)
+            if pending:
+                log.warning(f"{len(pending)} requested symbols weren't parsed in time before clearing the parser.")
         if self._parse_task is not None:
             self._parse_task.cancel()
+        for future in self._item_futures.values():
+            if not future.done():
+                future.set_result(None)
         self._queue.clear()
         self._page_doc_items.clear()
         self._item_futures.clear()
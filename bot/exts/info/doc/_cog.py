@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import asyncio
+import bisect
 import sys
 import textwrap
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from contextlib import suppress
 from types import SimpleNamespace
 from typing import Literal, NamedTuple
@@ -24,6 +25,7 @@ from bot.utils.messages import send_denial, wait_for_deletion
 
 from . import NAMESPACE, PRIORITY_PACKAGES, _batch_parser, doc_cache
 from ._inventory_parser import InvalidHeaderError, InventoryDict, fetch_inventory
+from ._redis_cache import InventoryRedisCache
 
 log = get_logger(__name__)
 
@@ -36,11 +38,20 @@ FORCE_PREFIX_GROUPS = (
     "pdbcommand",
     "2to3fixer",
 )
+# Positions of the groups in FORCE_PREFIX_GROUPS, for constant time membership checks and priority comparisons
+_FORCE_PREFIX_GROUP_INDICES = {group: index for index, group in enumerate(FORCE_PREFIX_GROUPS)}
 NOT_FOUND_DELETE_DELAY = RedirectOutput.delete_delay
+# Maximum amount of symbols suggested when the requested symbol doesn't exist
+MAX_SYMBOL_SUGGESTIONS = 5
 # Delay to wait before trying to reach a rescheduled inventory again, in minutes
 FETCH_RESCHEDULE_DELAY = SimpleNamespace(first=2, repeated=5)
 
 COMMAND_LOCK_SINGLETON = "inventory refresh"
+# Maximum amount of inventories fetched concurrently during a refresh
+MAX_CONCURRENT_INVENTORY_FETCHES = 8
+
+# Amount of recently fetched symbol Markdown kept in memory in front of the redis cache
+MARKDOWN_CACHE_SIZE = 256
 
 
 class DocItem(NamedTuple):
@@ -61,15 +72,21 @@ class DocItem(NamedTuple):
 class DocCog(commands.Cog):
     """A set of commands for querying & displaying documentation."""
 
+    inventory_cache = InventoryRedisCache()
+
     def __init__(self, bot: Bot):
         # Contains URLs to documentation home pages.
         # Used to calculate inventory diffs on refreshes and to display all currently stored inventories.
         self.base_urls = {}
         self.bot = bot
         self.doc_symbols: dict[str, DocItem] = {}  # Maps symbol names to objects containing their metadata.
+        # Alphabetically sorted keys of `doc_symbols` used for prefix searches, None when it has to be rebuilt.
+        self._sorted_symbol_names: list[str] | None = None
         self.item_fetcher = _batch_parser.BatchParser()
         # Maps a conflicting symbol name to a list of the new, disambiguated names created from conflicts with the name.
         self.renamed_symbols = defaultdict(list)
+        # LRU of recently fetched Markdown, the most recently used item is at the end.
+        self._markdown_cache: OrderedDict[DocItem, str] = OrderedDict()
 
         self.inventory_scheduler = Scheduler(self.__class__.__name__)
 
@@ -91,34 +108,62 @@ class DocCog(commands.Cog):
             * `base_url` is the root documentation URL for the specified package, used to build
                 absolute paths that link to specific symbols
             * `package` is the content of a intersphinx inventory.
+
+        If the package was already loaded, its previous symbols are removed first.
         """
+        if package_name in self.base_urls:
+            self.remove_package(package_name)
         self.base_urls[package_name] = base_url
+        self._sorted_symbol_names = None
+        doc_symbols = self.doc_symbols
+        add_item = self.item_fetcher.add_item
+        relative_url_path = ""
 
         for group, items in inventory.items():
-            for symbol_name, relative_doc_url in items:
-
-                # e.g. get 'class' from 'py:class'
-                group_name = group.split(":")[1]
-                symbol_name = self.ensure_unique_symbol_name(
-                    package_name,
-                    group_name,
-                    symbol_name,
-                )
+            # e.g. get 'class' from 'py:class'
+            # Intern fields that have shared content so we're not storing unique strings for every object
+            group_name = sys.intern(group.split(":")[1])
 
-                relative_url_path, _, symbol_id = relative_doc_url.partition("#")
-                # Intern fields that have shared content so we're not storing unique strings for every object
+            for symbol_name, relative_doc_url in items:
+                if symbol_name in doc_symbols:
+                    symbol_name = self.ensure_unique_symbol_name(
+                        package_name,
+                        group_name,
+                        symbol_name,
+                    )
+
+                page_path, _, symbol_id = relative_doc_url.partition("#")
+                # Symbols from the same page are usually listed next to each other,
+                # the path only has to be interned when it differs from the previous symbol's.
+                if page_path != relative_url_path:
+                    relative_url_path = sys.intern(page_path)
                 doc_item = DocItem(
                     package_name,
-                    sys.intern(group_name),
+                    group_name,
                     base_url,
-                    sys.intern(relative_url_path),
+                    relative_url_path,
                     symbol_id,
                 )
-                self.doc_symbols[symbol_name] = doc_item
-                self.item_fetcher.add_item(doc_item)
+                doc_symbols[symbol_name] = doc_item
+                add_item(doc_item)
 
         log.trace(f"Fetched inventory for {package_name}.")
 
+    def remove_package(self, package_name: str) -> None:
+        """Remove all symbols of `package_name`."""
+        for symbol_name in [name for name, item in self.doc_symbols.items() if item.package == package_name]:
+            del self.doc_symbols[symbol_name]
+        for symbol_name, renamed_symbols in list(self.renamed_symbols.items()):
+            renamed_symbols[:] = [name for name in renamed_symbols if name in self.doc_symbols]
+            if not renamed_symbols:
+                del self.renamed_symbols[symbol_name]
+        for doc_item in [item for item in self._markdown_cache if item.package == package_name]:
+            del self._markdown_cache[doc_item]
+
+        self.base_urls.pop(package_name, None)
+        self._sorted_symbol_names = None
+        self.item_fetcher.remove_package(package_name)
+
     async def update_or_reschedule_inventory(
         self,
         api_package_name: str,
@@ -128,6 +173,7 @@ class DocCog(commands.Cog):
         """
         Update the cog's inventories, or reschedule this method to execute again if the remote inventory is unreachable.
 
+        While the remote inventory is unreachable, the last successfully fetched version stored in redis is used.
         The first attempt is rescheduled to execute in `FETCH_RESCHEDULE_DELAY.first` minutes, the subsequent attempts
         in `FETCH_RESCHEDULE_DELAY.repeated` minutes.
         """
@@ -138,22 +184,40 @@ class DocCog(commands.Cog):
             log.warning(f"Invalid inventory header at {inventory_url}. Reason: {e}")
             return
 
-        if not package:
-            if api_package_name in self.inventory_scheduler:
-                self.inventory_scheduler.cancel(api_package_name)
-                delay = FETCH_RESCHEDULE_DELAY.repeated
-            else:
-                delay = FETCH_RESCHEDULE_DELAY.first
-            log.info(f"Failed to fetch inventory; attempting again in {delay} minutes.")
-            self.inventory_scheduler.schedule_later(
-                delay*60,
-                api_package_name,
-                self.update_or_reschedule_inventory(api_package_name, base_url, inventory_url),
-            )
-        else:
-            if not base_url:
-                base_url = self.base_url_from_inventory_url(inventory_url)
+        if not base_url:
+            base_url = self.base_url_from_inventory_url(inventory_url)
+
+        if package:
             self.update_single(api_package_name, base_url, package)
+            try:
+                await self.inventory_cache.set(inventory_url, package)
+            except Exception:
+                log.warning(f"Failed to store the inventory of {api_package_name} in redis.", exc_info=True)
+            return
+
+        # Only fall back to the stored inventory if the package isn't loaded from an earlier attempt already.
+        if api_package_name not in self.base_urls:
+            try:
+                stored_package = await self.inventory_cache.get(inventory_url)
+            except Exception:
+                log.warning(f"Failed to get the stored inventory of {api_package_name} from redis.", exc_info=True)
+                stored_package = None
+
+            if stored_package:
+                log.info(f"Failed to fetch inventory; using the stored inventory of {api_package_name}.")
+                self.update_single(api_package_name, base_url, stored_package)
+
+        if api_package_name in self.inventory_scheduler:
+            self.inventory_scheduler.cancel(api_package_name)
+            delay = FETCH_RESCHEDULE_DELAY.repeated
+        else:
+            delay = FETCH_RESCHEDULE_DELAY.first
+        log.info(f"Failed to fetch inventory; attempting again in {delay} minutes.")
+        self.inventory_scheduler.schedule_later(
+            delay*60,
+            api_package_name,
+            self.update_or_reschedule_inventory(api_package_name, base_url, inventory_url),
+        )
 
     def ensure_unique_symbol_name(self, package_name: str, group_name: str, symbol_name: str) -> str:
         """
@@ -192,9 +256,9 @@ class DocCog(commands.Cog):
 
         # If the symbol's group is a non-priority group from FORCE_PREFIX_GROUPS,
         # add it as a prefix to disambiguate the symbols.
-        if group_name in FORCE_PREFIX_GROUPS:
-            if item.group in FORCE_PREFIX_GROUPS:
-                needs_moving = FORCE_PREFIX_GROUPS.index(group_name) < FORCE_PREFIX_GROUPS.index(item.group)
+        if (group_index := _FORCE_PREFIX_GROUP_INDICES.get(group_name)) is not None:
+            if (item_group_index := _FORCE_PREFIX_GROUP_INDICES.get(item.group)) is not None:
+                needs_moving = group_index < item_group_index
             else:
                 needs_moving = False
             return rename(item.group if needs_moving else group_name, rename_extant=needs_moving)
@@ -212,17 +276,27 @@ class DocCog(commands.Cog):
 
         self.base_urls.clear()
         self.doc_symbols.clear()
+        self._sorted_symbol_names = None
         self.renamed_symbols.clear()
+        self._markdown_cache.clear()
         await self.item_fetcher.clear()
 
-        coros = [
-            self.update_or_reschedule_inventory(
-                package["package"], package["base_url"], package["inventory_url"]
-            ) for package in await self.bot.api_client.get("bot/documentation-links")
-        ]
-        await asyncio.gather(*coros)
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_INVENTORY_FETCHES)
+
+        async def update_package(package: dict[str, str]) -> None:
+            async with semaphore:
+                await self.update_or_reschedule_inventory(
+                    package["package"], package["base_url"], package["inventory_url"]
+                )
+
+        packages = await self.bot.api_client.get("bot/documentation-links")
+        results = await asyncio.gather(*map(update_package, packages), return_exceptions=True)
+        for package, result in zip(packages, results, strict=True):
+            if isinstance(result, BaseException):
+                log.error(f"Failed to update the inventory of {package['package']}.", exc_info=result)
         log.debug("Finished inventory refresh.")
         self.refresh_event.set()
+        await self.sort_symbol_names()
 
     def get_symbol_item(self, symbol_name: str) -> tuple[str, DocItem | None]:
         """
@@ -238,13 +312,55 @@ class DocCog(commands.Cog):
 
         return symbol_name, doc_item
 
+    async def sort_symbol_names(self) -> None:
+        """Sort the names of all symbols for prefix searches in a worker thread."""
+        symbol_names = list(self.doc_symbols)
+        sorted_symbol_names = await asyncio.to_thread(sorted, symbol_names)
+        # If symbols were added or removed while sorting, leave the list to be rebuilt by the next search.
+        if len(sorted_symbol_names) == len(self.doc_symbols):
+            self._sorted_symbol_names = sorted_symbol_names
+
+    def get_symbols_with_prefix(self, prefix: str, limit: int) -> list[str]:
+        """
+        Return up to `limit` symbol names starting with `prefix`, in alphabetical order.
+
+        Nothing is returned if the symbol names aren't sorted yet.
+        """
+        if self._sorted_symbol_names is None:
+            return []
+
+        start = bisect.bisect_left(self._sorted_symbol_names, prefix)
+        # Names sharing the prefix are next to each other in the sorted list.
+        return [
+            symbol_name for symbol_name in self._sorted_symbol_names[start:start + limit]
+            if symbol_name.startswith(prefix)
+        ]
+
+    async def get_symbol_suggestions(self, symbol_name: str) -> list[str]:
+        """
+        Get up to `MAX_SYMBOL_SUGGESTIONS` names of symbols that start with `symbol_name`.
+
+        As in `get_symbol_item`, if nothing is found and the name contains a space, its first word is used instead.
+        """
+        if self._sorted_symbol_names is None:
+            await self.sort_symbol_names()
+
+        suggestions = self.get_symbols_with_prefix(symbol_name, MAX_SYMBOL_SUGGESTIONS)
+        if not suggestions and " " in symbol_name:
+            suggestions = self.get_symbols_with_prefix(symbol_name.split(maxsplit=1)[0], MAX_SYMBOL_SUGGESTIONS)
+        return suggestions
+
     async def get_symbol_markdown(self, doc_item: DocItem) -> str:
         """
         Get the Markdown from the symbol `doc_item` refers to.
 
-        First a redis lookup is attempted, if that fails the `item_fetcher`
-        is used to fetch the page and parse the HTML from it into Markdown.
+        The in-memory cache of recently fetched symbols is checked first, followed by a redis lookup.
+        If both miss, the `item_fetcher` is used to fetch the page and parse the HTML from it into Markdown.
         """
+        if (markdown := self._markdown_cache.get(doc_item)) is not None:
+            self._markdown_cache.move_to_end(doc_item)
+            return markdown
+
         markdown = await doc_cache.get(doc_item)
 
         if markdown is None:
@@ -252,7 +368,7 @@ class DocCog(commands.Cog):
             try:
                 markdown = await self.item_fetcher.get_markdown(doc_item)
 
-            except aiohttp.ClientError as e:
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 log.warning(f"A network error has occurred when requesting parsing of {doc_item}.", exc_info=e)
                 return "Unable to parse the requested symbol due to a network error."
 
@@ -262,6 +378,10 @@ class DocCog(commands.Cog):
 
             if markdown is None:
                 return "Unable to parse the requested symbol."
+
+        self._markdown_cache[doc_item] = markdown
+        if len(self._markdown_cache) > MARKDOWN_CACHE_SIZE:
+            self._markdown_cache.popitem(last=False)
         return markdown
 
     async def create_symbol_embed(self, symbol_name: str) -> discord.Embed | None:
@@ -287,9 +407,10 @@ class DocCog(commands.Cog):
 
             # Show all symbols with the same name that were renamed in the footer,
             # with a max of 200 chars.
-            if symbol_name in self.renamed_symbols:
-                renamed_symbols = ", ".join(self.renamed_symbols[symbol_name])
-                footer_text = textwrap.shorten("Similar names: " + renamed_symbols, 200, placeholder=" ...")
+            if renamed_symbols := self.renamed_symbols.get(symbol_name):
+                footer_text = textwrap.shorten(
+                    "Similar names: " + ", ".join(renamed_symbols), 200, placeholder=" ..."
+                )
             else:
                 footer_text = ""
 
@@ -339,7 +460,10 @@ class DocCog(commands.Cog):
                 doc_embed = await self.create_symbol_embed(symbol)
 
             if doc_embed is None:
-                error_message = await send_denial(ctx, "No documentation found for the requested symbol.")
+                message = "No documentation found for the requested symbol."
+                if symbol.strip() and (suggestions := await self.get_symbol_suggestions(symbol)):
+                    message += "\n**Did you mean:** " + ", ".join(f"`{name}`" for name in suggestions)
+                error_message = await send_denial(ctx, message)
                 await wait_for_deletion(error_message, (ctx.author.id,), timeout=NOT_FOUND_DELETE_DELAY)
 
                 # Make sure that we won't cause a ghost-ping by deleting the message
@@ -403,6 +527,7 @@ class DocCog(commands.Cog):
         if not base_url:
             base_url = self.base_url_from_inventory_url(inventory_url)
         self.update_single(package_name, base_url, inventory_dict)
+        await self.sort_symbol_names()
         await ctx.send(f"Added the package `{package_name}` to the database and updated the inventories.")
 
     @docs_group.command(name="deletedoc", aliases=("removedoc", "rm", "d"))
@@ -452,6 +577,7 @@ class DocCog(commands.Cog):
         package_name: PackageName | Literal["*"]
     ) -> None:
         """Clear the persistent redis cache for `package`."""
+        self._markdown_cache.clear()
         if await doc_cache.delete(package_name):
             await self.item_fetcher.stale_inventory_notifier.symbol_counter.delete(package_name)
             await ctx.send(f"Successfully cleared the cache for `{package_name}`.")
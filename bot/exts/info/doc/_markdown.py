@@ -5,7 +5,7 @@ import markdownify
 from bs4.element import PageElement
 
 # See https://github.com/matthewwithanm/python-markdownify/issues/31
-markdownify.whitespace_re = re.compile(r"[\r\n\s\t ]+")
+markdownify.whitespace_re = re.compile(r"\s+")
 
 
 class DocMarkdownConverter(markdownify.MarkdownConverter):
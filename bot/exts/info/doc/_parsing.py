@@ -4,7 +4,7 @@ import re
 import string
 import textwrap
 from collections import namedtuple
-from collections.abc import Collection, Iterable, Iterator
+from collections.abc import Collection, Iterable, Iterator, Mapping
 from typing import TYPE_CHECKING
 
 from bs4 import BeautifulSoup
@@ -22,7 +22,7 @@ if TYPE_CHECKING:
 
 log = get_logger(__name__)
 
-_WHITESPACE_AFTER_NEWLINES_RE = re.compile(r"(?<=\n\n)(\s+)")
+_WHITESPACE_AFTER_NEWLINES_RE = re.compile(r"(?<=\n\n)\s+")
 _PARAMETERS_RE = re.compile(r"\((.+)\)")
 
 _NO_SIGNATURE_GROUPS = {
@@ -234,13 +234,29 @@ def _create_markdown(signatures: list[str] | None, description: Iterable[Tag], u
     return description
 
 
-def get_symbol_markdown(soup: BeautifulSoup, symbol_data: DocItem) -> str | None:
+def get_symbol_headings(soup: BeautifulSoup) -> dict[str, Tag]:
+    """Map the ids of all tags in `soup` to the first tag with that id."""
+    symbol_headings = {}
+    for tag in soup.find_all(id=True):
+        symbol_headings.setdefault(tag["id"], tag)
+    return symbol_headings
+
+
+def get_symbol_markdown(
+    soup: BeautifulSoup,
+    symbol_data: DocItem,
+    symbol_headings: Mapping[str, Tag] | None = None,
+) -> str | None:
     """
     Return parsed Markdown of the passed item using the passed in soup, truncated to fit within a discord message.
 
     The method of parsing and what information gets included depends on the symbol's group.
+    If `symbol_headings` from `get_symbol_headings` is passed, it's used to find the symbol instead of searching `soup`.
     """
-    symbol_heading = soup.find(id=symbol_data.symbol_id)
+    if symbol_headings is not None:
+        symbol_heading = symbol_headings.get(symbol_data.symbol_id)
+    else:
+        symbol_heading = soup.find(id=symbol_data.symbol_id)
     if symbol_heading is None:
         return None
     signature = None
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import asyncio
 import datetime
 import fnmatch
+import json
 import time
 from typing import TYPE_CHECKING
 
@@ -12,6 +14,7 @@ from bot.utils.lock import lock
 
 if TYPE_CHECKING:
     from ._cog import DocItem
+    from ._inventory_parser import InventoryDict
 
 WEEK_SECONDS = int(datetime.timedelta(weeks=1).total_seconds())
 
@@ -70,6 +73,10 @@ class DocRedisCache(RedisObject):
         """Return the Markdown content of the symbol `item` if it exists."""
         return await self.redis_session.client.hget(f"{self.namespace}:{item_key(item)}", item.symbol_id)
 
+    async def get_page_symbol_ids(self, item: DocItem) -> set[str]:
+        """Return the symbol ids of all symbols from the page of `item` that have their Markdown stored."""
+        return set(await self.redis_session.client.hkeys(f"{self.namespace}:{item_key(item)}"))
+
     async def delete(self, package: str) -> bool:
         """Remove all values for `package`; return True if at least one key was deleted, False otherwise."""
         pattern = f"{self.namespace}:{package}:*"
@@ -112,6 +119,25 @@ class StaleItemCounter(RedisObject):
         return False
 
 
+class InventoryRedisCache(RedisObject):
+    """Store the last successfully fetched version of inventories."""
+
+    async def set(self, inventory_url: str, inventory: InventoryDict) -> None:
+        """Store `inventory` for `inventory_url`, expiring after 4 weeks."""
+        # Inventories can be several megabytes large, don't block the event loop while serializing them.
+        serialized_inventory = await asyncio.to_thread(json.dumps, inventory)
+        await self.redis_session.client.set(
+            f"{self.namespace}:{inventory_url}", serialized_inventory, ex=WEEK_SECONDS * 4
+        )
+
+    async def get(self, inventory_url: str) -> InventoryDict | None:
+        """Return the stored inventory for `inventory_url` if it exists."""
+        inventory = await self.redis_session.client.get(f"{self.namespace}:{inventory_url}")
+        if inventory is None:
+            return None
+        return await asyncio.to_thread(json.loads, inventory)
+
+
 def item_key(item: DocItem) -> str:
     """Get the redis redis key string from `item`."""
     return f"{item.package}:{item.relative_url_path.removesuffix('.html')}"
@@ -0,0 +1,257 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase, TestCase, mock
+
+import aiohttp
+
+from bot.exts.info.doc import _batch_parser as batch_parser
+from bot.exts.info.doc._cog import DocItem
+
+
+def _doc_item(symbol_id: str, relative_url_path: str = "page.html") -> DocItem:
+    return DocItem("package", "function", "https://example.com/", relative_url_path, symbol_id)
+
+
+class ParseQueueTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(batch_parser, "StaleInventoryNotifier")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.parser = batch_parser.BatchParser()
+
+    def _queue_page(self, soup, doc_items):
+        for item in doc_items:
+            self.parser._queue[item] = soup
+            self.parser._queue.move_to_end(item, last=False)
+
+    def test_equal_items_share_a_queue_entry(self):
+        """Equal `DocItem`s under different symbol names are only queued once."""
+        self._queue_page(object(), [_doc_item("a"), _doc_item("b"), _doc_item("a")])
+        self.assertEqual(list(self.parser._queue), [_doc_item("a"), _doc_item("b")])
+
+    def test_move_to_front(self):
+        """A moved item is popped before the rest of the queue."""
+        soup = object()
+        items = [_doc_item(str(number)) for number in range(5)]
+        self._queue_page(soup, items)
+
+        self.parser._move_to_front(items[3])
+        self.assertEqual(self.parser._pop_batch()[1][0], items[3])
+
+    def test_move_to_front_missing_item(self):
+        """Moving an item that isn't queued raises a KeyError."""
+        with self.assertRaises(KeyError):
+            self.parser._move_to_front(_doc_item("a"))
+
+    def test_batch_stops_at_page_boundary(self):
+        """A batch only contains items from the page of its first item."""
+        first_page, second_page = [_doc_item(str(number)) for number in range(3)], [_doc_item("x", "other.html")]
+        first_soup = object()
+        self._queue_page(first_soup, first_page)
+        self._queue_page(object(), second_page)
+
+        self.assertEqual(self.parser._pop_batch(), (first_soup, first_page))
+
+    def test_batch_size_limited(self):
+        """A batch contains at most `PARSE_BATCH_SIZE` items."""
+        self._queue_page(object(), [_doc_item(str(number)) for number in range(batch_parser.PARSE_BATCH_SIZE + 5)])
+
+        self.assertEqual(len(self.parser._pop_batch()[1]), batch_parser.PARSE_BATCH_SIZE)
+        self.assertEqual(len(self.parser._pop_batch()[1]), 5)
+
+    def test_requested_item_parsed_alone(self):
+        """An item with a result future is returned without the rest of its page."""
+        items = [_doc_item(str(number)) for number in range(3)]
+        self._queue_page(object(), items)
+        self.parser._item_futures[items[0]] = mock.Mock()
+
+        self.assertEqual(self.parser._pop_batch()[1], [items[0]])
+
+
+class ParsePageTests(TestCase):
+
+    def test_only_main_element_parsed(self):
+        """Only the element with `role="main"` is kept when the page has one."""
+        soup = batch_parser._parse_page(
+            b"<!DOCTYPE html><html><head><title>t</title></head><body><div class='sidebar' id='side'></div>"
+            b"<div role='main'><dl><dt id='a'>a</dt><dd>d</dd></dl></div></body></html>",
+            None,
+        )
+        self.assertIsNotNone(soup.find(id="a"))
+        self.assertIsNone(soup.find(id="side"))
+        self.assertIsNone(soup.find("title"))
+
+    def test_whole_page_parsed_without_main_element(self):
+        """The whole page is parsed when it doesn't have an element with `role="main"`."""
+        soup = batch_parser._parse_page(
+            b"<!DOCTYPE html><html><body><div><dl><dt id='a'>a</dt><dd>d</dd></dl></div></body></html>",
+            None,
+        )
+        self.assertIsNotNone(soup.find(id="a"))
+
+
+PAGE_HTML = (
+    b"<html><body><div role='main'>"
+    b"<dl><dt id='a'>a()</dt><dd><p>Doc.</p></dd></dl>"
+    b"<dl><dt id='b'>b()</dt><dd><p>Doc.</p></dd></dl>"
+    b"<dl><dt id='c'>c()</dt><dd><p>Doc.</p></dd></dl>"
+    b"</div></body></html>"
+)
+
+
+class GetMarkdownTests(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(batch_parser, "StaleInventoryNotifier")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.doc_cache = mock.AsyncMock()
+        self.doc_cache.get_page_symbol_ids.return_value = set()
+        patcher = mock.patch.object(batch_parser, "doc_cache", self.doc_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.response = mock.AsyncMock(charset=None)
+        self.response.read.return_value = PAGE_HTML
+        self.response.__aenter__.return_value = self.response
+        self.bot = mock.MagicMock()
+        self.bot.http_session.get.return_value = self.response
+        patcher = mock.patch.object(batch_parser.bot, "instance", self.bot, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.parser = batch_parser.BatchParser()
+
+    async def asyncTearDown(self):
+        await self.parser.clear()
+
+    async def test_requested_item_parsed_after_page_items_change(self):
+        """The requested item is parsed even if it's removed from its page's items while the page is fetched."""
+        item = _doc_item("a")
+        self.parser.add_item(item)
+
+        async def read():
+            self.parser.remove_package("package")
+            return PAGE_HTML
+
+        self.response.read.side_effect = read
+
+        markdown = await asyncio.wait_for(self.parser.get_markdown(item), 2)
+        self.assertIn("Doc.", markdown)
+
+    async def test_requested_markdown_returned(self):
+        """The Markdown of a requested item is returned and its future is cleaned up."""
+        item = _doc_item("a")
+        self.parser.add_item(item)
+
+        self.assertIn("Doc.", await self.parser.get_markdown(item))
+        self.assertEqual(self.parser._item_futures, {})
+        self.doc_cache.set.assert_any_await(item, mock.ANY)
+
+    async def test_concurrent_requests_fetch_once(self):
+        """Concurrent requests for an item share a single page fetch."""
+        item = _doc_item("a")
+        self.parser.add_item(item)
+
+        results = await asyncio.gather(self.parser.get_markdown(item), self.parser.get_markdown(item))
+
+        self.assertEqual(results[0], results[1])
+        self.bot.http_session.get.assert_called_once()
+
+    async def test_item_being_parsed_not_fetched(self):
+        """A request for an item in a batch that's being parsed waits for the batch instead of fetching the page."""
+        item = _doc_item("a")
+        self.parser.add_item(item)
+        self.parser._parsing_items.add(item)
+
+        task = asyncio.create_task(self.parser.get_markdown(item))
+        await asyncio.sleep(0)
+        self.parser._item_futures[item].set_result("markdown")
+
+        self.assertEqual(await task, "markdown")
+        self.bot.http_session.get.assert_not_called()
+
+    async def test_cached_symbols_not_queued(self):
+        """Items of the fetched page that already have their Markdown in redis aren't parsed again."""
+        items = [_doc_item(symbol_id) for symbol_id in "abc"]
+        for item in items:
+            self.parser.add_item(item)
+        self.doc_cache.get_page_symbol_ids.return_value = {"b"}
+
+        await self.parser.get_markdown(items[0])
+        await self.parser.get_markdown(items[2])
+
+        self.assertEqual([call.args[0] for call in self.doc_cache.set.await_args_list], [items[0], items[2]])
+
+    async def test_fetch_error_passed_to_waiters(self):
+        """An error when fetching the page is raised for every request waiting on it, and the next request retries."""
+        item = _doc_item("a")
+        self.parser.add_item(item)
+        fetch_event = asyncio.Event()
+
+        async def read():
+            await fetch_event.wait()
+            raise aiohttp.ClientError
+
+        self.response.read.side_effect = read
+        tasks = [asyncio.create_task(self.parser.get_markdown(item)) for _ in range(2)]
+        await asyncio.sleep(0)
+        fetch_event.set()
+
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            self.assertIsInstance(result, aiohttp.ClientError)
+        self.assertEqual(self.parser._item_futures, {})
+
+        self.response.read.side_effect = None
+        self.assertIn("Doc.", await self.parser.get_markdown(item))
+
+    async def test_cancelled_fetch_fails_other_waiters(self):
+        """Cancelling the request that fetches the page doesn't cancel the other requests waiting on it."""
+        item = _doc_item("a")
+        self.parser.add_item(item)
+        self.response.read.side_effect = asyncio.Event().wait
+
+        fetching_task = asyncio.create_task(self.parser.get_markdown(item))
+        waiting_task = asyncio.create_task(self.parser.get_markdown(item))
+        await asyncio.sleep(0)
+        fetching_task.cancel()
+
+        with self.assertRaises(asyncio.CancelledError):
+            await fetching_task
+        with self.assertRaises(RuntimeError):
+            await waiting_task
+        self.assertEqual(self.parser._item_futures, {})
+
+    async def test_fetch_error_after_clear(self):
+        """A fetch failing after the parser was cleared doesn't fail on the already resolved future."""
+        item = _doc_item("a")
+        self.parser.add_item(item)
+        fetch_event = asyncio.Event()
+
+        async def read():
+            await fetch_event.wait()
+            raise aiohttp.ClientError
+
+        self.response.read.side_effect = read
+        task = asyncio.create_task(self.parser.get_markdown(item))
+        await asyncio.sleep(0)
+        with mock.patch.object(batch_parser, "CLEAR_TIMEOUT", 0):
+            await self.parser.clear()
+        fetch_event.set()
+
+        self.assertIsNone(await task)
+
+    async def test_clear_resolves_pending_requests(self):
+        """Requests that aren't parsed before the clear timeout get a None result."""
+        item = _doc_item("a")
+        self.parser.add_item(item)
+        self.parser._parsing_items.add(item)
+
+        task = asyncio.create_task(self.parser.get_markdown(item))
+        await asyncio.sleep(0)
+        with mock.patch.object(batch_parser, "CLEAR_TIMEOUT", 0.01):
+            await self.parser.clear()
+
+        self.assertIsNone(await task)
+        self.assertEqual(self.parser._item_futures, {})
@@ -0,0 +1,145 @@
+import unittest
+from unittest import mock
+
+from bot.exts.info.doc import _cog
+from bot.exts.info.doc._redis_cache import InventoryRedisCache
+from tests.base import RedisTestCase
+from tests.helpers import MockBot
+
+INVENTORY_URL = "https://example.com/objects.inv"
+INVENTORY = {"py:function": [["func", "page.html#func"]], "py:class": [["Class", "page.html#Class"]]}
+
+
+class InventoryRedisCacheTests(RedisTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.cache = InventoryRedisCache(namespace="test")
+
+    async def test_stored_inventory_returned(self):
+        await self.cache.set(INVENTORY_URL, INVENTORY)
+        self.assertEqual(await self.cache.get(INVENTORY_URL), INVENTORY)
+
+    async def test_missing_inventory(self):
+        self.assertIsNone(await self.cache.get(INVENTORY_URL))
+
+
+class UpdateOrRescheduleInventoryTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch("bot.exts.info.doc._batch_parser.StaleInventoryNotifier")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.cog = _cog.DocCog(MockBot())
+        self.cog.inventory_scheduler = mock.MagicMock()
+        self.inventory_cache = mock.AsyncMock()
+        patcher = mock.patch.object(_cog.DocCog, "inventory_cache", self.inventory_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _update(self, fetched_inventory):
+        with mock.patch.object(_cog, "fetch_inventory", mock.AsyncMock(return_value=fetched_inventory)):
+            await self.cog.update_or_reschedule_inventory("package", "", INVENTORY_URL)
+
+    async def test_fetched_inventory_loaded_and_stored(self):
+        """A fetched inventory is loaded and stored in redis without rescheduling."""
+        await self._update(INVENTORY)
+
+        self.assertEqual(self.cog.doc_symbols.keys(), {"func", "Class"})
+        self.inventory_cache.set.assert_awaited_once_with(INVENTORY_URL, INVENTORY)
+        self.cog.inventory_scheduler.schedule_later.assert_not_called()
+
+    async def test_store_failure_keeps_inventory(self):
+        """An error when storing the inventory doesn't prevent it from being loaded."""
+        self.inventory_cache.set.side_effect = ConnectionError
+
+        await self._update(INVENTORY)
+
+        self.assertEqual(self.cog.doc_symbols.keys(), {"func", "Class"})
+
+    async def test_stored_inventory_used_and_rescheduled(self):
+        """The stored inventory is loaded when fetching fails, and the fetch is still retried."""
+        self.inventory_cache.get.return_value = INVENTORY
+
+        await self._update(None)
+
+        self.assertEqual(self.cog.doc_symbols.keys(), {"func", "Class"})
+        self.cog.inventory_scheduler.schedule_later.assert_called_once()
+        self.cog.inventory_scheduler.schedule_later.call_args.args[2].close()
+
+    async def test_no_stored_inventory_rescheduled(self):
+        """Without a stored inventory, nothing is loaded and the fetch is retried."""
+        self.inventory_cache.get.return_value = None
+
+        await self._update(None)
+
+        self.assertEqual(self.cog.doc_symbols, {})
+        self.cog.inventory_scheduler.schedule_later.assert_called_once()
+        self.cog.inventory_scheduler.schedule_later.call_args.args[2].close()
+
+    async def test_fetched_inventory_replaces_stored_inventory(self):
+        """A successful retry replaces the stored inventory's symbols instead of conflicting with them."""
+        self.inventory_cache.get.return_value = INVENTORY
+        await self._update(None)
+        self.cog.inventory_scheduler.schedule_later.call_args.args[2].close()
+
+        await self._update({"py:function": [["func", "new_page.html#func"]]})
+
+        self.assertEqual(self.cog.doc_symbols.keys(), {"func"})
+        self.assertEqual(self.cog.doc_symbols["func"].relative_url_path, "new_page.html")
+        self.assertEqual(self.cog.renamed_symbols, {})
+
+
+class SymbolSuggestionTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch("bot.exts.info.doc._batch_parser.StaleInventoryNotifier")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.cog = _cog.DocCog(MockBot())
+        self.cog.update_single(
+            "package",
+            "https://example.com/",
+            {"py:function": [(name, f"page.html#{name}") for name in ("foo.bar", "foo.baz", "foobar", "other")]},
+        )
+
+    async def test_symbols_with_prefix_suggested(self):
+        self.assertEqual(await self.cog.get_symbol_suggestions("foo.ba"), ["foo.bar", "foo.baz"])
+
+    async def test_first_word_used_for_names_with_spaces(self):
+        self.assertEqual(await self.cog.get_symbol_suggestions("foo.ba extra"), ["foo.bar", "foo.baz"])
+
+    async def test_suggestions_limited(self):
+        with mock.patch.object(_cog, "MAX_SYMBOL_SUGGESTIONS", 2):
+            self.assertEqual(await self.cog.get_symbol_suggestions("foo"), ["foo.bar", "foo.baz"])
+
+    async def test_sorted_names_rebuilt_after_update(self):
+        await self.cog.sort_symbol_names()
+        self.cog.update_single("other", "https://example.org/", {"py:function": [("foo.bat", "page.html#foo.bat")]})
+
+        self.assertEqual(await self.cog.get_symbol_suggestions("foo.ba"), ["foo.bar", "foo.bat", "foo.baz"])
+
+
+class UpdateSingleTests(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("bot.exts.info.doc._batch_parser.StaleInventoryNotifier")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cog = _cog.DocCog(MockBot())
+
+    def test_group_name_is_second_part_of_role(self):
+        """The group of a symbol is taken from the second part of its role."""
+        self.cog.update_single(
+            "package",
+            "https://example.com/",
+            {
+                "py:class": [("Class", "page.html#Class")],
+                "rst:directive:option": [("option", "page.html#option")],
+            },
+        )
+
+        self.assertEqual(self.cog.doc_symbols["Class"].group, "class")
+        self.assertEqual(self.cog.doc_symbols["option"].group, "directive")
@@ -1,5 +1,7 @@
 from unittest import TestCase
 
+from bs4 import BeautifulSoup
+
 from bot.exts.info.doc import _parsing as parsing
 from bot.exts.info.doc._markdown import DocMarkdownConverter
 
@@ -87,3 +89,12 @@ class MarkdownConverterTest(TestCase):
             with self.subTest(input_string=input_string):
                 d = DocMarkdownConverter(page_url="https://example.com")
                 self.assertEqual(d.convert(input_string), expected_output)
+
+
+class SymbolHeadingsTest(TestCase):
+    def test_first_tag_with_id_used(self):
+        soup = BeautifulSoup('<dl><dt id="a">first</dt><dt id="b">b</dt><dd id="a">second</dd></dl>', "lxml")
+        headings = parsing.get_symbol_headings(soup)
+
+        self.assertEqual(headings.keys(), {"a", "b"})
+        self.assertEqual(headings["a"].text, "first")